@@ -8,8 +8,32 @@ import queue
 import shutil
 from datetime import datetime
 import cv2
+import yt_dlp
 import concurrent.futures
 import logging
+import argparse
+import asyncio
+
+try:
+    from decord import VideoReader, cpu as decord_cpu
+except ImportError:
+    VideoReader = None  # Fall back to OpenCV's sequential decoder
+
+try:
+    import av
+except ImportError:
+    av = None  # Keyframe-aligned sampling needs PyAV
+
+try:
+    import aiohttp
+    import aiofiles
+except ImportError:
+    aiohttp = None  # Fall back to yt-dlp's own downloader
+
+try:
+    import liburing  # Linux only
+except ImportError:
+    liburing = None  # Fall back to regular blocking writes
 
 # Set up logging
 logging.basicConfig(
@@ -25,16 +49,208 @@ logger = logging.getLogger()
 # Global variables
 DOWNLOAD_DIR = "temp_downloads"
 OUTPUT_DIR = "final-dataset"
+DETECTIONS_CSV = "performer_detections.csv"  # Written when frames are analysed in-process
 MAX_WORKERS = 4  # Number of parallel threads
-RATE_LIMIT_DELAY = (3, 8)  # Random delay range in seconds between requests (min, max)
-DOWNLOAD_TIMEOUT = 600  # 10 minutes timeout for downloads
+MAX_IN_FLIGHT = MAX_WORKERS * 4  # Submitted but unfinished videos, bounds memory
+RATE_LIMIT_DELAY = (3, 8)  # Random delay range in seconds before each worker's request (min, max)
 LOCK = threading.Lock()  # Lock for thread-safe operations
+MODEL_LOCK = threading.Lock()  # YOLO predictors are not thread-safe
+
+# Options for the in-process yt-dlp downloader
+YDL_OPTIONS = {
+    'format': 'bestvideo+bestaudio/best',  # Best quality available
+    'merge_output_format': 'mp4',          # Merge to mp4 format
+    'outtmpl': os.path.join(DOWNLOAD_DIR, '%(video_number)s_%(id)s_temp.%(ext)s'),  # Unique per CSV row
+    'quiet': True,
+    'no_warnings': True,                   # Hide warnings
+    'nocheckcertificate': True,            # Skip HTTPS certificate validation
+    'socket_timeout': 60
+}
+# Options for resolving a single progressive stream that aiohttp can fetch directly;
+# frames only need the video track, so no audio merge is required
+RESOLVE_OPTIONS = {
+    'format': 'bestvideo[protocol=https]/best[protocol=https]',
+    'quiet': True,
+    'no_warnings': True,
+    'nocheckcertificate': True,
+    'socket_timeout': 60
+}
+THREAD_STATE = threading.local()  # Per-thread YoutubeDL instances
+
+DOWNLOAD_TIMEOUT = 600  # 10 minutes timeout for downloads
+DOWNLOAD_RETRIES = 3  # Attempts per direct download, with exponential backoff
+CHUNK_SIZE = 1 << 20  # Bytes per read when streaming a download to disk
+HTTP_LOOP = None  # Event loop running the shared aiohttp session
+HTTP_SESSION = None  # Connection pool shared by all downloads
+HTTP_SEMAPHORE = None  # Caps concurrent direct downloads at MAX_WORKERS
+# Quality 85 encodes noticeably faster than OpenCV's default 95 with no visible
+# difference at YOLO's 640px input; optimized/progressive Huffman passes are skipped
+JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 0, cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+MIN_SEPARATION_SECONDS = 10  # Minimum time between sampled frames
+KEYFRAME_SAMPLING = True  # Sample only keyframes (no intra-GOP decoding) when PyAV is installed
+GRAB_MAX_GAP = 250  # Longest gap walked with grab() before seeking, about one GOP (x264's default keyint)
+URING_ENTRIES = 16  # io_uring queue depth, writes are submitted in batches of this size
 
 def ensure_dir_exists(directory):
     """Create directory if it doesn't exist"""
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+def open_video_capture(video_path):
+    """
+    Open a video with hardware-accelerated decoding when available.
+
+    OpenCV picks any supported accelerator (NVDEC, VAAPI, QSV, D3D11, ...) and
+    silently falls back to software decoding otherwise. A specific decoder can be
+    forced through OPENCV_FFMPEG_CAPTURE_OPTIONS, e.g. "video_codec;h264_cuvid".
+    """
+    cap = cv2.VideoCapture(
+        video_path,
+        cv2.CAP_FFMPEG,
+        [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    )
+    if not cap.isOpened():
+        # Older OpenCV builds reject the acceleration params, retry with defaults
+        cap.release()
+        cap = cv2.VideoCapture(video_path)
+    return cap
+
+def get_ring():
+    """Return this thread's io_uring instance, creating it on first use"""
+    ring = getattr(THREAD_STATE, 'ring', None)
+    if ring is None:
+        ring = liburing.io_uring()
+        liburing.io_uring_queue_init(URING_ENTRIES, ring, 0)
+        THREAD_STATE.ring = ring
+    return ring
+
+def close_ring():
+    """Tear down this thread's io_uring instance, e.g. after a failed batch"""
+    ring = getattr(THREAD_STATE, 'ring', None)
+    if ring is not None:
+        THREAD_STATE.ring = None
+        liburing.io_uring_queue_exit(ring)
+
+def write_files_uring(files):
+    """Write (path, bytes) pairs through io_uring, one submission syscall per batch"""
+    ring = get_ring()
+    cqe = liburing.io_uring_cqe()
+    for start in range(0, len(files), URING_ENTRIES):
+        batch = files[start:start + URING_ENTRIES]
+        fds = []
+        try:
+            for path, payload in batch:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                fds.append(fd)
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_write(sqe, fd, payload, len(payload), 0)
+            liburing.io_uring_submit(ring)
+            
+            # Reap one completion per write; no write can exceed its payload,
+            # so matching totals means every file was written in full
+            written = 0
+            for _ in batch:
+                liburing.io_uring_wait_cqe(ring, cqe)
+                written += liburing.trap_error(cqe.res)
+                liburing.io_uring_cqe_seen(ring, cqe)
+            expected = sum(len(payload) for _, payload in batch)
+            if written != expected:
+                raise OSError(f"Short io_uring write ({written}/{expected} bytes)")
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+def write_files(files):
+    """Write (path, bytes) pairs, batched through io_uring when liburing is available"""
+    if liburing is not None:
+        try:
+            write_files_uring(files)
+            return
+        except Exception as e:
+            close_ring()
+            logger.warning(f"io_uring write failed, using regular writes: {str(e)}")
+    
+    for path, payload in files:
+        with open(path, 'wb') as f:
+            f.write(payload)
+
+def get_downloader(name='ydl', options=YDL_OPTIONS):
+    """
+    Return this thread's YoutubeDL instance for the given options, creating it on first use.
+    
+    Reusing one instance per worker avoids re-initialising the extractors and
+    keeps HTTP connections to Vimeo alive across videos.
+    """
+    ydl = getattr(THREAD_STATE, name, None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(options)
+        setattr(THREAD_STATE, name, ydl)
+    return ydl
+
+def start_http_downloader():
+    """Start a background event loop with one aiohttp session shared by all worker threads"""
+    global HTTP_LOOP, HTTP_SESSION, HTTP_SEMAPHORE
+    
+    async def create_session():
+        connector = aiohttp.TCPConnector(limit_per_host=MAX_WORKERS, ssl=False)
+        timeout = aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout), asyncio.Semaphore(MAX_WORKERS)
+    
+    HTTP_LOOP = asyncio.new_event_loop()
+    threading.Thread(target=HTTP_LOOP.run_forever, daemon=True).start()
+    HTTP_SESSION, HTTP_SEMAPHORE = asyncio.run_coroutine_threadsafe(create_session(), HTTP_LOOP).result()
+
+def stop_http_downloader():
+    """Close the shared aiohttp session and stop its event loop"""
+    global HTTP_LOOP, HTTP_SESSION, HTTP_SEMAPHORE
+    if HTTP_LOOP is None:
+        return
+    asyncio.run_coroutine_threadsafe(HTTP_SESSION.close(), HTTP_LOOP).result()
+    HTTP_LOOP.call_soon_threadsafe(HTTP_LOOP.stop)
+    HTTP_LOOP, HTTP_SESSION, HTTP_SEMAPHORE = None, None, None
+
+async def fetch_to_file(url, headers, output_path):
+    """Stream a URL to disk over the shared session, retrying with exponential backoff"""
+    async with HTTP_SEMAPHORE:
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                async with HTTP_SESSION.get(url, headers=headers) as response:
+                    response.raise_for_status()
+                    async with aiofiles.open(output_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            await f.write(chunk)
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == DOWNLOAD_RETRIES - 1:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+def download_direct(url, video_number):
+    """
+    Resolve a progressive video stream with yt-dlp and fetch it with aiohttp
+    
+    Returns:
+    str: Path to downloaded file or None if there is no direct stream or the fetch failed
+    """
+    try:
+        info = get_downloader('resolver', RESOLVE_OPTIONS).extract_info(url, download=False)
+    except yt_dlp.utils.DownloadError:
+        return None
+    
+    output_path = os.path.join(DOWNLOAD_DIR, f"{video_number}_temp.{info.get('ext', 'mp4')}")
+    future = asyncio.run_coroutine_threadsafe(
+        fetch_to_file(info['url'], info.get('http_headers'), output_path),
+        HTTP_LOOP
+    )
+    try:
+        future.result()
+        return output_path
+    except Exception as e:
+        logger.warning(f"Direct download failed for video {video_number}, falling back to yt-dlp: {str(e)}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return None
+
 def download_video(url, video_number):
     """
     Download a Vimeo video in the best available format
@@ -42,122 +258,327 @@ def download_video(url, video_number):
     Returns:
     str: Path to downloaded file or None if failed
     """
-    output_path = os.path.join(DOWNLOAD_DIR, f"{video_number}_temp.mp4")
-    
-    # Command to download the video in best quality
-    command = [
-        "yt-dlp",
-        "--format", "bestvideo+bestaudio/best",  # Best quality available
-        "--merge-output-format", "mp4",          # Merge to mp4 format
-        "--output", output_path,                 # Output file path
-        "--no-warnings",                         # Hide warnings
-        "--no-check-certificate",                # Skip HTTPS certificate validation
-        url                                      # Video URL
-    ]
-    
     try:
         logger.info(f"Downloading video {video_number} from {url}")
-        process = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=DOWNLOAD_TIMEOUT
-        )
         
-        if process.returncode == 0 and os.path.exists(output_path):
+        # Prefer a direct fetch over the shared connection pool
+        if HTTP_SESSION is not None:
+            output_path = download_direct(url, video_number)
+            if output_path:
+                logger.info(f"Successfully downloaded video {video_number}")
+                return output_path
+        
+        # Name the file after the CSV row too: duplicate links are downloaded
+        # concurrently and must not share (and delete) one file
+        info = get_downloader().extract_info(url, download=True, extra_info={'video_number': video_number})
+        output_path = info['requested_downloads'][0]['filepath']
+        
+        if os.path.exists(output_path):
             logger.info(f"Successfully downloaded video {video_number}")
             return output_path
         else:
-            logger.error(f"Failed to download video {video_number}: {process.stderr}")
+            logger.error(f"Failed to download video {video_number}: {output_path} not found")
             return None
             
-    except subprocess.TimeoutExpired:
-        logger.error(f"Timeout while downloading video {video_number}")
+    except yt_dlp.utils.DownloadError as e:
+        logger.error(f"Failed to download video {video_number}: {str(e)}")
         return None
     except Exception as e:
         logger.error(f"Exception while downloading video {video_number}: {str(e)}")
         return None
 
-def capture_random_frames(video_path, video_number, num_frames=5):
+def select_frame_indices(frame_count, fps, video_number, num_frames=5, candidates=None):
     """
-    Capture random frames from a video with minimum time separation.
+    Pick random frame indices with minimum time separation.
+    
+    Parameters:
+    candidates (list): Sorted frame indices to choose from (all frames if None)
     
     Returns:
-    bool: True if successful, False otherwise
+    list: Sorted frame indices (evenly spaced if the video is too short)
     """
-    try:
-        # Open the video file
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            logger.error(f"Error opening video file {video_path}")
-            return False
+    if candidates is None:
+        candidates = range(frame_count)
+    
+    min_frame_separation = int(MIN_SEPARATION_SECONDS * fps)
+    frame_indices = []
+
+    # Check if the video is long enough for the requested separation
+    required_frame_span = (num_frames - 1) * min_frame_separation
+    if frame_count < required_frame_span:
+        logger.warning(f"Video {video_number} is too short for 10s separation. Spacing frames evenly.")
+        # Fallback to evenly spacing the frames if the video is too short
+        if len(candidates) >= num_frames:
+            frame_indices = [candidates[int(i * (len(candidates) - 1) / (num_frames - 1))] for i in range(num_frames)]
+        else:
+            frame_indices = list(candidates) # Just take all frames if fewer than requested
+    else:
+        # Iteratively find random frames with the minimum required separation
+        max_attempts = 200  # Prevents an infinite loop
+        for _ in range(max_attempts):
+            if len(frame_indices) >= num_frames:
+                break
+            
+            new_frame_index = random.choice(candidates)
+            
+            # Check if it's far enough from all other existing frame indices
+            is_valid = all(abs(new_frame_index - idx) >= min_frame_separation for idx in frame_indices)
+            
+            if is_valid:
+                frame_indices.append(new_frame_index)
+
+        if len(frame_indices) < num_frames:
+            logger.warning(f"Could only find {len(frame_indices)}/{num_frames} frames with 10s separation for video {video_number}")
+
+    return sorted(frame_indices)
+
+def read_frames_keyframes(video_path, video_number, num_frames=5):
+    """
+    Decode sampled keyframes with PyAV, seeking straight to each one.
+    
+    Keyframes decode without any dependent frames, so unlike arbitrary frames
+    they need no decoding of the rest of their GOP.
+    
+    Returns:
+    tuple: (frame indices, BGR frames aligned with them, None where decoding failed),
+    or None if the video could not be read or its keyframes cannot give
+    num_frames separated samples (short videos, few keyframes)
+    """
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        fps = float(stream.average_rate or 0)
+        
+        # Index the keyframes by demuxing packets only, nothing is decoded here
+        keyframe_pts = [
+            packet.pts for packet in container.demux(stream)
+            if packet.is_keyframe and packet.pts is not None
+        ]
+        if not (fps > 0 and keyframe_pts):
+            logger.error(f"Invalid FPS ({fps}) or no keyframes ({len(keyframe_pts)}) for video {video_number}")
+            return None
+        
+        # Express keyframes as frame indices so the usual sampling rules apply
+        time_base = float(stream.time_base)
+        start_pts = stream.start_time or 0
+        pts_by_index = {}
+        for pts in keyframe_pts:
+            pts_by_index.setdefault(int(round((pts - start_pts) * time_base * fps)), pts)
+        keyframe_indices = sorted(pts_by_index)
+        frame_count = max(stream.frames, keyframe_indices[-1] + 1)
+        
+        # Too few keyframes or too short for the separation: let the caller
+        # sample arbitrary frames instead of returning fewer samples
+        required_frame_span = (num_frames - 1) * int(MIN_SEPARATION_SECONDS * fps)
+        if len(keyframe_indices) < num_frames or frame_count < required_frame_span:
+            logger.info(f"Video {video_number} has too few keyframes ({len(keyframe_indices)}) or is too short for keyframe sampling")
+            return None
+        
+        frame_indices = select_frame_indices(
+            frame_count, fps, video_number, num_frames, candidates=keyframe_indices
+        )
+        if len(frame_indices) < num_frames:
+            return None
+        
+        frames = []
+        for frame_idx in frame_indices:
+            try:
+                container.seek(pts_by_index[frame_idx], stream=stream)
+                frame = next(container.decode(stream))
+                frames.append(frame.to_ndarray(format="bgr24"))
+            except (StopIteration, av.FFmpegError):
+                frames.append(None)
         
+        return frame_indices, frames
+
+def read_frames_decord(video_path, video_number, num_frames=5):
+    """
+    Decode the sampled frames with decord in a single batched call.
+    
+    Returns:
+    tuple: (frame indices, BGR frames aligned with them), or None if the video could not be read
+    """
+    vr = VideoReader(video_path, ctx=decord_cpu(0))
+    fps = vr.get_avg_fps()
+    frame_count = len(vr)
+    
+    if not (fps > 0 and frame_count > 0):
+        logger.error(f"Invalid FPS ({fps}) or frame count ({frame_count}) for video {video_number}")
+        return None
+    
+    frame_indices = select_frame_indices(frame_count, fps, video_number, num_frames)
+    batch = vr.get_batch(frame_indices).asnumpy()
+    
+    # decord returns RGB, the rest of the pipeline expects OpenCV's BGR
+    return frame_indices, [cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) for frame in batch]
+
+def read_frames_opencv(video_path, video_number, num_frames=5):
+    """
+    Decode the sampled frames with OpenCV, seeking to distant frames and
+    grabbing forward to nearby ones (see grab_frames).
+    
+    Returns:
+    tuple: (frame indices, BGR frames aligned with them, None where decoding failed),
+    or None if the video could not be read
+    """
+    # Open the video file
+    cap = open_video_capture(video_path)
+    if not cap.isOpened():
+        logger.error(f"Error opening video file {video_path}")
+        return None
+    
+    try:
         # Get video properties
         fps = cap.get(cv2.CAP_PROP_FPS)
         frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
         if not (fps > 0 and frame_count > 0):
             logger.error(f"Invalid FPS ({fps}) or frame count ({frame_count}) for video {video_number}")
-            cap.release()
-            return False
-
-       
+            return None
+        
+        frame_indices = select_frame_indices(frame_count, fps, video_number, num_frames)
+        return frame_indices, grab_frames(cap, frame_indices)
+    finally:
+        cap.release()
 
-        min_separation_seconds = 10
-        min_frame_separation = int(min_separation_seconds * fps)
-        frame_indices = []
+def grab_frames(cap, frame_indices):
+    """
+    Decode the frames at the sorted frame_indices.
+    
+    With the FFmpeg backend grab() still decodes each frame and only skips
+    the BGR conversion done by retrieve(), so grabbing is cheaper than a
+    seek only for short gaps. Targets more than GRAB_MAX_GAP frames ahead are
+    reached with a seek, which decodes at most one GOP; closer ones are
+    walked to with grab(). Targets past the end of the stream stay None.
+    """
+    frames = [None] * len(frame_indices)
+    current_idx = -1  # Index of the frame the last grab() landed on
+    for i, frame_idx in enumerate(frame_indices):
+        if frame_idx - current_idx > GRAB_MAX_GAP:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            current_idx = frame_idx - 1
+        while current_idx < frame_idx:
+            if not cap.grab():
+                return frames
+            current_idx += 1
+        ret, frame = cap.retrieve()
+        if ret:
+            frames[i] = frame
+    return frames
 
-        # Check if the video is long enough for the requested separation
-        required_frame_span = (num_frames - 1) * min_frame_separation
-        if frame_count < required_frame_span:
-            logger.warning(f"Video {video_number} is too short for 10s separation. Spacing frames evenly.")
-            # Fallback to evenly spacing the frames if the video is too short
-            if frame_count >= num_frames:
-                frame_indices = [int(i * (frame_count - 1) / (num_frames - 1)) for i in range(num_frames)]
+def capture_random_frames(video_path, video_number, num_frames=5, save_frames=True):
+    """
+    Capture random frames from a video with minimum time separation.
+    
+    Samples keyframes with PyAV when KEYFRAME_SAMPLING is on and PyAV is
+    installed, unless the keyframes cannot give num_frames samples; otherwise
+    uses decord's batched decoder when it is installed, and OpenCV as the
+    last resort.
+    
+    Parameters:
+    save_frames (bool): Also write the frames as JPEGs under OUTPUT_DIR
+    
+    Returns:
+    list: Captured frames as BGR numpy arrays, one per sample position with
+    None where a frame failed (empty if the video could not be read)
+    """
+    try:
+        sampled = None
+        if KEYFRAME_SAMPLING and av is not None:
+            sampled = read_frames_keyframes(video_path, video_number, num_frames)
+        if sampled is None:
+            if VideoReader is not None:
+                sampled = read_frames_decord(video_path, video_number, num_frames)
             else:
-                frame_indices = list(range(frame_count)) # Just take all frames if fewer than requested
-        else:
-            # Iteratively find random frames with the minimum required separation
-            max_attempts = 200  # Prevents an infinite loop
-            for _ in range(max_attempts):
-                if len(frame_indices) >= num_frames:
-                    break
-                
-                new_frame_index = random.randint(0, frame_count - 1)
-                
-                # Check if it's far enough from all other existing frame indices
-                is_valid = all(abs(new_frame_index - idx) >= min_frame_separation for idx in frame_indices)
-                
-                if is_valid:
-                    frame_indices.append(new_frame_index)
-
-            if len(frame_indices) < num_frames:
-                logger.warning(f"Could only find {len(frame_indices)}/{num_frames} frames with 10s separation for video {video_number}")
-
-        
+                sampled = read_frames_opencv(video_path, video_number, num_frames)
+        if sampled is None:
+            return []
+        frame_indices, sampled_frames = sampled
 
         # Ensure the output directory exists
         frame_dir = os.path.join(OUTPUT_DIR, str(video_number))
-        ensure_dir_exists(frame_dir)
+        if save_frames:
+            ensure_dir_exists(frame_dir)
         
-        # Extract and save frames
-        for i, frame_idx in enumerate(sorted(frame_indices), 1):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            if ret:
-                output_path = os.path.join(frame_dir, f"{video_number}_{i}.jpg")
-                cv2.imwrite(output_path, frame)
-                logger.info(f"Saved frame {i} for video {video_number} at index {frame_idx}")
-            else:
+        frames = []
+        encoded = []
+        for i, (frame_idx, frame) in enumerate(zip(frame_indices, sampled_frames), 1):
+            # Keep a placeholder for a failed frame so sample i stays frame i
+            frames.append(frame)
+            if frame is None:
                 logger.warning(f"Failed to extract frame {i} for video {video_number} at index {frame_idx}")
+                continue
+            if save_frames:
+                ok, buffer = cv2.imencode(".jpg", frame, JPEG_PARAMS)
+                if ok:
+                    output_path = os.path.join(frame_dir, f"{video_number}_{i}.jpg")
+                    encoded.append((output_path, buffer.tobytes()))
+                    logger.info(f"Saved frame {i} for video {video_number} at index {frame_idx}")
+                else:
+                    logger.warning(f"Failed to encode frame {i} for video {video_number} at index {frame_idx}")
         
-        cap.release()
-        return True
+        # Write all JPEGs of this video together
+        if encoded:
+            write_files(encoded)
+        
+        return frames
         
     except Exception as e:
         logger.error(f"Error capturing frames for video {video_number}: {str(e)}")
-        return False
+        return []
+
+def classify_performance(count):
+    """Classify performance based on performer count."""
+    if count == 1:
+        return "Solo"
+    elif count == 2:
+        return "Duo"
+    elif 3 <= count <= 5:
+        return "Small Group"
+    else:  # count > 5
+        return "Large Group"
+
+def detect_performers(model, frames, num_frames=5):
+    """
+    Run YOLO on in-memory frames, skipping the JPEG write/read round-trip.
+    
+    Frames that failed to decode (None) keep their position and are
+    described as "No frame found".
+    
+    Returns:
+    list: One sample description per frame, in the categorization CSV format
+    """
+    decoded = [frame for frame in frames if frame is not None]
+    results = iter([])
+    if decoded:
+        with MODEL_LOCK:
+            results = iter(model(decoded, conf=0.25, iou=0.7, verbose=False))
+    
+    # Put each result back at its frame's position
+    aligned = [None if frame is None else next(results) for frame in frames]
+    return describe_samples(aligned, num_frames)
+
+def describe_samples(results, num_frames=5):
+    """
+    Describe each YOLO result in the categorization CSV format, padded to num_frames
+    
+    results holds one entry per sample position, None where there is no frame.
+    """
+    sample_details = []
+    for result in results:
+        if result is None:
+            sample_details.append("No frame found")
+            continue
+        boxes = result.boxes
+        count = len(boxes)
+        if count > 0:
+            confidence = float(boxes.conf.mean())
+            sample_details.append(f"{count} performers ({classify_performance(count)}, conf: {confidence:.2f})")
+        else:
+            sample_details.append("No frame found")
+    
+    # Pad missing frames so every video has the same number of samples
+    sample_details.extend(["No frame found"] * (num_frames - len(sample_details)))
+    return sample_details
 
 def secure_delete_file(file_path):
     """Securely delete a file and ensure it's removed from trash"""
@@ -176,13 +597,13 @@ def secure_delete_file(file_path):
         logger.error(f"Error deleting file {file_path}: {str(e)}")
         return False
 
-def process_video(video_number, url, stats):
-    """Process a single video: download, capture frames, and clean up"""
+def process_video(video_number, url, stats, save_frames=True, model=None, detections=None):
+    """Process a single video: download, capture frames, optionally detect performers, and clean up"""
     try:
-        # Respect rate limiting
-        with LOCK:
-            delay = random.uniform(RATE_LIMIT_DELAY[0], RATE_LIMIT_DELAY[1])
-            time.sleep(delay)
+        # Respect rate limiting; each worker waits on its own so the delays
+        # overlap instead of queueing behind one another
+        delay = random.uniform(RATE_LIMIT_DELAY[0], RATE_LIMIT_DELAY[1])
+        time.sleep(delay)
         
         # Download the video
         video_path = download_video(url, video_number)
@@ -192,11 +613,21 @@ def process_video(video_number, url, stats):
             return False
         
         # Capture random frames
-        frames_success = capture_random_frames(video_path, video_number)
+        frames = capture_random_frames(video_path, video_number, save_frames=save_frames)
+        frames_success = any(frame is not None for frame in frames)
+        
+        # Analyse the frames while they are still in memory; decoding happened
+        # above, so only the model call itself holds MODEL_LOCK
+        if frames_success and model is not None:
+            sample_details = detect_performers(model, frames)
         
         # Clean up the downloaded video
         secure_delete_file(video_path)
         
+        if frames_success and model is not None:
+            with LOCK:
+                detections.append([video_number, url] + sample_details)
+        
         # Update stats
         with LOCK:
             if frames_success:
@@ -212,23 +643,34 @@ def process_video(video_number, url, stats):
             stats['failed'] += 1
         return False
 
-def batch_process_videos(csv_file, limit=None):
+def batch_process_videos(csv_file, limit=None, save_frames=True, model_path=None):
     """
     Process videos from CSV with multithreading
     
     Parameters:
     csv_file (str): Path to the CSV file
     limit (int): Maximum number of videos to process (None for all)
+    save_frames (bool): Write the captured frames to OUTPUT_DIR as JPEGs
+    model_path (str): YOLO model used to detect performers in-process (None to skip)
     """
     start_time = time.time()
     
     # Create necessary directories
     ensure_dir_exists(DOWNLOAD_DIR)
-    ensure_dir_exists(OUTPUT_DIR)
+    if save_frames:
+        ensure_dir_exists(OUTPUT_DIR)
+    
+    # Load the detector once, shared by all worker threads
+    model = None
+    detections = []
+    if model_path:
+        from ultralytics import YOLO
+        model = YOLO(model_path)
+        logger.info(f"Loaded YOLO model from {model_path}")
     
     # Read the CSV file
     try:
-        df = pd.read_csv(csv_file)
+        df = pd.read_csv(csv_file, engine="pyarrow", dtype_backend="pyarrow")
         logger.info(f"CSV loaded successfully. Found {len(df)} videos.")
     except Exception as e:
         logger.error(f"Error reading CSV file: {str(e)}")
@@ -254,21 +696,44 @@ def batch_process_videos(csv_file, limit=None):
     
     logger.info(f"Starting processing of {stats['total']} videos with {MAX_WORKERS} workers")
     
+    # Share one HTTP connection pool across all downloads when aiohttp is installed
+    if aiohttp is not None:
+        start_http_downloader()
+    
     # Process videos in parallel
     with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Submit all tasks
-        future_to_video = {
-            executor.submit(process_video, row["video_number"], row["vimeo_link"], stats): row["video_number"]
-            for _, row in df.iterrows() if not pd.isna(row["vimeo_link"]) and row["vimeo_link"].strip() != ""
-        }
+        # Walk the two columns directly instead of iterrows()
+        rows = zip(df["video_number"].to_numpy(), df["vimeo_link"].to_numpy())
+        future_to_video = {}
         
-        # Process completed tasks
-        for future in concurrent.futures.as_completed(future_to_video):
-            video_number = future_to_video[future]
-            try:
-                future.result()
-            except Exception as e:
-                logger.error(f"Error processing video {video_number}: {str(e)}")
+        def drain(return_when):
+            done, _ = concurrent.futures.wait(future_to_video, return_when=return_when)
+            for future in done:
+                video_number = future_to_video.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error processing video {video_number}: {str(e)}")
+        
+        # Keep at most MAX_IN_FLIGHT tasks queued so memory stays flat on long CSVs
+        for video_number, vimeo_link in rows:
+            if not isinstance(vimeo_link, str) or vimeo_link.strip() == "":
+                continue
+            if len(future_to_video) >= MAX_IN_FLIGHT:
+                drain(concurrent.futures.FIRST_COMPLETED)
+            future = executor.submit(process_video, video_number, vimeo_link, stats, save_frames, model, detections)
+            future_to_video[future] = video_number
+        
+        # Process the remaining tasks
+        drain(concurrent.futures.ALL_COMPLETED)
+    
+    stop_http_downloader()
+    
+    # Save in-process detections in the same sample format as the categorization scripts
+    if model is not None:
+        columns = ['video_number', 'vimeo_link'] + [f'sample_{i}' for i in range(1, 6)]
+        pd.DataFrame(detections, columns=columns).sort_values('video_number').to_csv(DETECTIONS_CSV, index=False)
+        logger.info(f"Saved detections for {len(detections)} videos to {DETECTIONS_CSV}")
     
     # Clean up temporary directory
     try:
@@ -292,14 +757,6 @@ def batch_process_videos(csv_file, limit=None):
     logger.info("=" * 50)
 
 if __name__ == "__main__":
-    # Check for yt-dlp
-    try:
-        subprocess.run(["yt-dlp", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except FileNotFoundError:
-        logger.info("yt-dlp is not installed. Installing now...")
-        subprocess.run(["pip", "install", "yt-dlp"], stdout=subprocess.PIPE)
-        logger.info("yt-dlp installed successfully")
-    
     # Check for OpenCV
     try:
         import cv2
@@ -309,8 +766,19 @@ if __name__ == "__main__":
         import cv2
         logger.info("OpenCV installed successfully")
     
-    # Replace with your CSV file path
-    csv_file = "final-list.csv"
+    parser = argparse.ArgumentParser(description="Download Vimeo videos and capture random frames")
+    parser.add_argument("csv_file", nargs="?", default="final-list.csv",
+                        help="CSV with 'video_number' and 'vimeo_link' columns")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Maximum number of videos to process")
+    parser.add_argument("--model", default=None,
+                        help="YOLO model to detect performers on the frames in memory")
+    parser.add_argument("--save-frames", action="store_true",
+                        help="Also write frames to disk when --model is given")
+    args = parser.parse_args()
+    
+    # Without a model the JPEGs are the only output, so always keep them
+    save_frames = args.save_frames or not args.model
     
     # Process all videos (or specify a limit)
-    batch_process_videos(csv_file)
\ No newline at end of file
+    batch_process_videos(args.csv_file, limit=args.limit, save_frames=save_frames, model_path=args.model)
\ No newline at end of file
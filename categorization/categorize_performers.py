@@ -1,18 +1,29 @@
 import pandas as pd
+import numpy as np
 import re
 
+# Leading performer count, e.g. the "1" in "1 performers (Solo, conf: 0.81)"
+_NUM_RE = re.compile(r'^(\d+)')
+
 # Function to extract performer count from text like "1 performers (Solo, conf: 0.81)"
 def extract_performer_count(text):
     if pd.isna(text):
         return None
     
+    text = str(text)
+    
+    # Fast path: the first word is the number itself
+    head = text.split(" ", 1)[0]
+    if head.isdecimal():
+        return int(head)
+    
     # Use regular expression to extract the number at the beginning
-    match = re.match(r'^(\d+)', str(text))
+    match = _NUM_RE.match(text)
     if match:
         return int(match.group(1))
     
     # Check if it contains "5+"
-    if "5+" in str(text):
+    if "5+" in text:
         return "5+"
         
     return None
@@ -40,58 +51,59 @@ def categorize_performers(count):
     except (ValueError, TypeError):
         return "unknown"
 
-# Function to determine the final verdict
-def determine_verdict(row):
-    # Extract counts from each sample
-    counts = []
-    for i in range(1, 6):
-        sample_key = f'sample_{i}'
-        if sample_key in row and not pd.isna(row[sample_key]):
-            count = extract_performer_count(row[sample_key])
-            if count is not None:
-                counts.append(count)
-    
-    if not counts:
-        return "unknown"
-    
-    # Convert counts to categories
-    categories = [categorize_performers(count) for count in counts]
-    
-    # Count occurrences of each category
-    category_counts = {}
-    for category in categories:
-        if category != "unknown":
-            if category in category_counts:
-                category_counts[category] += 1
-            else:
-                category_counts[category] = 1
-    
-    # If no valid categories were found
-    if not category_counts:
-        return "unknown"
+SAMPLE_COLUMNS = [f'sample_{i}' for i in range(1, 6)]
+
+# Labels of the category codes used by the vectorized verdict
+CATEGORY_LABELS = np.array(["solo (1)", "duo (2)", "small group (3-5)", "large group (5+)"])
+LARGE_GROUP = 3
+
+# Function to categorize every sample cell at once
+def sample_categories(df):
+    """
+    Return an (N x 5) array with the category code of each sample, matching
+    categorize_performers(extract_performer_count(text)): 0 solo, 1 duo,
+    2 small group, 3 large group, -1 unknown or missing.
+    """
+    codes = np.full((len(df), len(SAMPLE_COLUMNS)), -1, dtype=np.int8)
+    for j, column in enumerate(SAMPLE_COLUMNS):
+        if column not in df.columns:
+            continue
+        
+        text = df[column].astype("string")
+        counts = pd.to_numeric(text.str.extract(_NUM_RE, expand=False)).to_numpy(dtype=float, na_value=np.nan)
+        five_plus = text.str.contains("5+", regex=False).fillna(False).to_numpy(dtype=bool)
+        
+        codes[:, j] = np.select(
+            [counts == 1, counts == 2, (counts >= 3) & (counts <= 5), counts > 5, np.isnan(counts) & five_plus],
+            [0, 1, 2, 3, 3],
+            default=-1
+        )
+    return codes
+
+# Function to determine the final verdict for every row
+def determine_verdicts(df):
+    codes = sample_categories(df)
+    num_samples = len(SAMPLE_COLUMNS)
     
-    # Find the most common category
-    max_count = 0
-    most_common = "unknown"
+    # Count occurrences of each category, and where each one first appears
+    matches = codes[:, :, None] == np.arange(len(CATEGORY_LABELS))
+    category_counts = matches.sum(axis=1)
+    first_seen = np.where(category_counts > 0, matches.argmax(axis=1), num_samples)
     
-    for category, count in category_counts.items():
-        if count > max_count:
-            max_count = count
-            most_common = category
+    # Find the most common category; ties go to the one seen first
+    most_common = np.argmax(category_counts * (num_samples + 1) - first_seen, axis=1)
     
     # Special case: If any sample suggests "large group (5+)" and consistency is low
-    consistency = 0
-    if 'consistency' in row and not pd.isna(row['consistency']):
-        try:
-            consistency = float(row['consistency'])
-        except (ValueError, TypeError):
-            consistency = 0
-    
-    # Check if any category is "large group (5+)"        
-    if "large group (5+)" in categories and consistency < 0.8:
-        return "large group (5+)"
+    if 'consistency' in df.columns:
+        consistency = pd.to_numeric(df['consistency'], errors='coerce').fillna(0).to_numpy()
+    else:
+        consistency = np.zeros(len(df))
+    has_large_group = (codes == LARGE_GROUP).any(axis=1)
+    verdict_codes = np.where(has_large_group & (consistency < 0.8), LARGE_GROUP, most_common)
     
-    return most_common
+    # Rows without any valid category stay "unknown"
+    verdicts = np.where(category_counts.max(axis=1) > 0, CATEGORY_LABELS[verdict_codes], "unknown")
+    return pd.Series(verdicts, index=df.index)
 
 # Main execution
 if __name__ == "__main__":
@@ -103,7 +115,7 @@ if __name__ == "__main__":
         
         # Add the verdict column
         print("Analyzing and adding verdicts...")
-        df['new_verdict'] = df.apply(determine_verdict, axis=1)
+        df['new_verdict'] = determine_verdicts(df)
         
         # Save to a new file
         output_file = 'performer_analysis_results_with_verdict.csv'
@@ -0,0 +1,358 @@
+"""
+Shared YOLO model loading and batched detection for the categorization scripts.
+
+Runs the detector in the cheapest precision the hardware supports: a
+TensorRT engine (INT8 when calibration frames are given, FP16 otherwise) on
+CUDA GPUs, and an INT8 OpenVINO export on CPU-only machines.
+
+Detection runs in an inference process (InferenceServer) that loads the model
+once per script run and batches the frames posted to it.
+"""
+import os
+import atexit
+import random
+import queue
+import threading
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import torch
+import yaml
+from tqdm import tqdm
+from ultralytics import YOLO
+
+try:
+    from turbojpeg import TurboJPEG
+    JPEG_DECODER = TurboJPEG()  # libjpeg-turbo's SIMD decoder
+except (ImportError, OSError, RuntimeError):
+    JPEG_DECODER = None  # Fall back to cv2.imdecode
+
+USE_CUDA = torch.cuda.is_available()
+DEVICE = 0 if USE_CUDA else "cpu"
+
+# Keyword arguments shared by every detection call
+PREDICT_ARGS = {
+    'conf': 0.25,
+    'iou': 0.7,
+    'device': DEVICE,
+    'half': USE_CUDA,
+    'verbose': False
+}
+
+ENGINE_MAX_BATCH = 64  # Largest batch the exported TensorRT engine accepts
+BATCH_SIZE = 16  # Frames per model call in the inference server
+BATCH_WAIT = 0.05  # Seconds the server waits for more frames to fill a batch
+IO_WORKERS = os.cpu_count() or 4  # Threads reading images from disk
+DECODE_WORKERS = os.cpu_count() or 4  # Threads decoding JPEGs in the inference server
+QUEUE_SIZE = 64  # Frames waiting for the model, bounds memory
+CALIBRATION_SAMPLES = 500  # Random frames used for INT8 calibration
+
+def write_calibration_yaml(model, calibration_dir, yaml_path):
+    """
+    Describe a random sample of a folder of frames as a dataset for INT8 calibration.
+    
+    Up to CALIBRATION_SAMPLES frames are listed in a .txt file next to the
+    YAML, so the one-time export does not calibrate on every frame.
+    """
+    calibration_dir = os.path.abspath(calibration_dir)
+    with os.scandir(calibration_dir) as entries:
+        images = [
+            entry.path for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in ('.jpg', '.jpeg', '.png')
+        ]
+    sample = random.sample(images, min(CALIBRATION_SAMPLES, len(images)))
+    
+    list_path = os.path.splitext(yaml_path)[0] + ".txt"
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write("".join(f"{path}\n" for path in sample))
+    
+    list_path = os.path.abspath(list_path)
+    dataset = {
+        'path': calibration_dir,
+        'train': list_path,
+        'val': list_path,
+        'names': model.names
+    }
+    with open(yaml_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(dataset, f)
+    return yaml_path
+
+def export_tensorrt(model, model_path, calibration_dir=None):
+    """
+    Export the model to a TensorRT engine next to the .pt file, once.
+
+    The engine has fused kernels and a dynamic batch axis up to
+    ENGINE_MAX_BATCH. With calibration_dir it is built in INT8, calibrated on
+    those frames. The file name records precision and batch shape
+    (<stem>_int8_dynamic_b64.engine) so engines built by other scripts are
+    never picked up by mistake. Delete the .engine file to force a rebuild.
+    """
+    precision = "int8" if calibration_dir else "fp16"
+    stem = os.path.splitext(model_path)[0]
+    engine_path = f"{stem}_{precision}_dynamic_b{ENGINE_MAX_BATCH}.engine"
+    if os.path.exists(engine_path):
+        return engine_path
+
+    export_args = {
+        'format': 'engine',
+        'half': True,
+        'imgsz': 640,
+        'workspace': 4,
+        'dynamic': True,
+        'batch': ENGINE_MAX_BATCH
+    }
+    if calibration_dir:
+        yaml_path = os.path.splitext(model_path)[0] + "_calibration.yaml"
+        export_args['int8'] = True
+        export_args['data'] = write_calibration_yaml(model, calibration_dir, yaml_path)
+
+    print(f"Exporting TensorRT engine to {engine_path} (one-time step)...")
+    os.replace(model.export(**export_args), engine_path)
+    return engine_path
+
+def load_model(model_path, calibration_dir=None):
+    """
+    Load a YOLO model for the current hardware.
+
+    On CUDA the model is exported to TensorRT (see export_tensorrt) and the
+    engine is loaded. On CPU the model is exported once to OpenVINO next to
+    the .pt file and that export is loaded instead: INT8 calibrated on
+    calibration_dir when given, full precision otherwise (INT8 export with no
+    dataset would calibrate on a downloaded sample set). If an export fails
+    the PyTorch weights are used, in FP16 on CUDA through PREDICT_ARGS.
+    """
+    model = YOLO(model_path)
+    if USE_CUDA:
+        try:
+            return YOLO(export_tensorrt(model, model_path, calibration_dir), task="detect")
+        except Exception as e:
+            print(f"TensorRT export unavailable, using PyTorch weights: {str(e)}")
+            return model
+
+    stem = os.path.splitext(model_path)[0]
+    try:
+        if calibration_dir:
+            openvino_dir = stem + "_int8_openvino_model"
+            if not os.path.exists(openvino_dir):
+                yaml_path = write_calibration_yaml(model, calibration_dir, stem + "_calibration.yaml")
+                model.export(format="openvino", int8=True, data=yaml_path, imgsz=640)
+        else:
+            openvino_dir = stem + "_openvino_model"
+            if not os.path.exists(openvino_dir):
+                model.export(format="openvino", imgsz=640)
+        return YOLO(openvino_dir, task="detect")
+    except Exception as e:
+        print(f"OpenVINO export unavailable, using PyTorch weights: {str(e)}")
+        return model
+
+def summarize_detections(confidences):
+    """Return (performer count, average confidence) from one frame's box confidences."""
+    count = len(confidences)
+    
+    avg_conf = 0
+    if count > 0:
+        avg_conf = float(confidences.mean())
+    
+    return count, avg_conf
+
+def decode_image(data):
+    """Decode image bytes to a BGR array with libjpeg-turbo if available, else OpenCV; None on failure."""
+    if not data:
+        return None  # Empty file, cv2.imdecode raises on an empty buffer
+    if JPEG_DECODER is not None:
+        try:
+            return JPEG_DECODER.decode(data)
+        except Exception:
+            pass  # Not a JPEG turbojpeg can read, let OpenCV try
+    try:
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None
+
+def inference_worker(model_path, calibration_dir, requests, responses, batch_size):
+    """
+    Body of the inference process: load the model once, then serve requests.
+    
+    Requests are (req_id, jpeg_bytes) pairs. A feeder thread hands each one
+    to a pool of DECODE_WORKERS threads as it arrives, so frames are decoded
+    in parallel while the model runs on the previous batch. Decoded frames
+    are gathered into batches of up to batch_size per model call. Each answer
+    is (req_id, confs) as a numpy array, or (req_id, None) if the image could
+    not be read. A None request shuts the worker down.
+    """
+    try:
+        model = load_model(model_path, calibration_dir)
+    except Exception as e:
+        responses.put(('error', str(e)))
+        return
+    responses.put(('ready', None))
+    
+    decoder = ThreadPoolExecutor(max_workers=DECODE_WORKERS)
+    decoded = queue.Queue(maxsize=QUEUE_SIZE)
+    
+    def feed():
+        while True:
+            item = requests.get()
+            if item is None:
+                decoded.put(None)
+                return
+            req_id, data = item
+            future = decoder.submit(decode_image, data) if data is not None else None
+            decoded.put((req_id, future))
+    
+    threading.Thread(target=feed, daemon=True).start()
+    
+    running = True
+    while running:
+        batch = [decoded.get()]
+        if batch[0] is None:
+            break
+        
+        # Top up the batch with requests that arrive shortly after
+        while len(batch) < batch_size:
+            try:
+                item = decoded.get(timeout=BATCH_WAIT)
+            except queue.Empty:
+                break
+            if item is None:
+                running = False
+                break
+            batch.append(item)
+        
+        req_ids, images = [], []
+        for req_id, future in batch:
+            image = None
+            if future is not None:
+                image = future.result()
+            if image is None:
+                responses.put((req_id, None))
+            else:
+                req_ids.append(req_id)
+                images.append(image)
+        
+        if images:
+            results = model(images, batch=len(images), **PREDICT_ARGS)
+            for req_id, result in zip(req_ids, results):
+                responses.put((req_id, result.boxes.conf.cpu().numpy()))
+    
+    decoder.shutdown()
+
+class InferenceServer:
+    """
+    YOLO detection served from a separate process that loads the model once.
+    
+    Both categorization scripts post frames to it through detect_frames(); use
+    get_inference_server() to reuse one running server within a run. The
+    server lives only as long as the script that started it.
+    """
+    def __init__(self, model_path, calibration_dir=None, batch_size=BATCH_SIZE):
+        # spawn: CUDA cannot be initialised again in a forked child
+        context = mp.get_context("spawn")
+        self.requests = context.Queue(maxsize=QUEUE_SIZE)
+        self.responses = context.Queue()
+        self.process = context.Process(
+            target=inference_worker,
+            args=(model_path, calibration_dir, self.requests, self.responses, batch_size)
+        )
+        self.process.start()
+        
+        # Wait for the model to load, but notice if the process dies first
+        while True:
+            try:
+                status, message = self.responses.get(timeout=1)
+                break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError("Inference process exited during startup")
+        if status == 'error':
+            self.process.join()
+            raise RuntimeError(message)
+    
+    def submit(self, req_id, data, timeout=None):
+        """Queue JPEG bytes (or None for a missing image) for detection."""
+        self.requests.put((req_id, data), timeout=timeout)
+    
+    def get_result(self):
+        """Wait for the next (req_id, confs) answer."""
+        while True:
+            try:
+                return self.responses.get(timeout=1)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError("Inference process exited unexpectedly")
+    
+    def close(self):
+        """Stop the inference process."""
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join()
+
+# Running servers by configuration, so a run loads each model only once
+_servers = {}
+
+def get_inference_server(model_path, calibration_dir=None, batch_size=BATCH_SIZE):
+    """Return a running InferenceServer for this model configuration, starting one if needed."""
+    key = (model_path, calibration_dir, batch_size)
+    server = _servers.get(key)
+    if server is None or not server.process.is_alive():
+        server = InferenceServer(model_path, calibration_dir, batch_size)
+        if not _servers:
+            # Registered after multiprocessing's own exit hook so this runs
+            # first; that hook would otherwise wait on the idle server forever
+            atexit.register(_close_servers)
+        _servers[key] = server
+    return server
+
+def _close_servers():
+    for server in _servers.values():
+        server.close()
+
+def detect_frames(server, frame_paths, io_workers=IO_WORKERS):
+    """
+    Run detection over many image files, overlapping disk reads with inference.
+    
+    IO worker threads read the JPEG bytes and post them to the inference
+    server, whose bounded request queue provides backpressure, while the
+    calling thread collects the answers.
+    
+    Args:
+        server: Running InferenceServer
+        frame_paths: Dict mapping a key (e.g. (video_number, i)) to an image path
+        io_workers: Number of threads reading images
+    
+    Returns:
+        Dict mapping each key to (count, avg_conf); missing images give (0, 0)
+    """
+    keys = list(frame_paths)
+    detections = {}
+    stop = threading.Event()
+    
+    def read_frame(req_id):
+        try:
+            with open(frame_paths[keys[req_id]], 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+        
+        # Block while the server is busy, but give up if the consumer stopped
+        while not stop.is_set():
+            try:
+                server.submit(req_id, data, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+    
+    pool = ThreadPoolExecutor(max_workers=io_workers)
+    try:
+        for req_id in range(len(keys)):
+            pool.submit(read_frame, req_id)
+        
+        for _ in tqdm(range(len(keys)), desc="Detecting frames"):
+            req_id, confs = server.get_result()
+            detections[keys[req_id]] = (0, 0) if confs is None else summarize_detections(confs)
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+    
+    return detections
@@ -1,7 +1,7 @@
 import os
 import csv
 import pandas as pd
-from ultralytics import YOLO
+from detector import get_inference_server, detect_frames
 from tqdm import tqdm
 import numpy as np
 import cv2
@@ -26,25 +26,6 @@ def get_valid_path(prompt, check_exists=True, is_file=False):
         # If we get here, path is valid
         return path
 
-def count_performers(image_path, model):
-    """Count performers in an image using the YOLO model."""
-    if not os.path.exists(image_path):
-        return 0, 0  # Return count 0 and confidence 0 if image doesn't exist
-    
-    # Run detection
-    results = model(image_path, conf=0.25, iou=0.7)
-    
-    # Extract boxes and confidences
-    boxes = results[0].boxes
-    count = len(boxes)
-    
-    # Calculate average confidence
-    avg_conf = 0
-    if count > 0:
-        avg_conf = float(boxes.conf.mean())
-    
-    return count, avg_conf
-
 def classify_performance(count):
     """Classify performance based on performer count."""
     if count == 1:
@@ -59,21 +40,21 @@ def classify_performance(count):
 def analyze_consistency(counts):
     """Analyze if manual review is needed based on count consistency."""
     # Filter out zeros (missing images)
-    valid_counts = [c for c in counts if c > 0]
+    valid_counts = np.fromiter((c for c in counts if c > 0), dtype=np.int64)
     
-    if not valid_counts:
+    if not valid_counts.size:
         return "No valid frames found", 0
     
+    # Count frequency of each performer count
+    count_freq = np.bincount(valid_counts)
+    most_common = count_freq.max()
+    
     # Check if all counts are the same
-    if len(set(valid_counts)) == 1:
+    if most_common == valid_counts.size:
         return "Consistent (100%)", 100
     
-    # Count frequency of each performer count
-    count_freq = Counter(valid_counts)
-    most_common = count_freq.most_common(1)[0]
-    
     # Calculate percentage of agreement
-    agreement_pct = (most_common[1] / len(valid_counts)) * 100
+    agreement_pct = float(most_common / valid_counts.size * 100)
     
     if agreement_pct >= 60:
         return f"Mostly consistent ({agreement_pct:.0f}%)", agreement_pct
@@ -123,7 +104,7 @@ def main():
     # Load the YOLOv11 model
     print(f"\nLoading YOLO model from {model_path}...")
     try:
-        model = YOLO(model_path)
+        server = get_inference_server(model_path, calibration_dir=frames_dir)
         print("Model loaded successfully!")
     except Exception as e:
         print(f"Error loading model: {str(e)}")
@@ -138,10 +119,18 @@ def main():
         print(f"Error loading CSV: {str(e)}")
         return
     
+    # Detect performers in every frame; disk reads overlap with batched inference
+    print(f"\nAnalyzing frames with YOLOv11 model...")
+    frame_paths = {
+        (video_number, i): os.path.join(frames_dir, f"{video_number}_{i}.jpg")
+        for video_number in video_info
+        for i in range(1, 6)
+    }
+    detections = detect_frames(server, frame_paths)
+    
     # Process all videos
     results = []
     
-    print(f"\nAnalyzing frames with YOLOv11 model...")
     for video_number, vimeo_link in tqdm(video_info.items(), desc="Processing videos"):
         # Check if frames exist for this video
         sample_counts = []
@@ -150,8 +139,7 @@ def main():
         
         # Process each of the 5 frames
         for i in range(1, 6):
-            image_path = os.path.join(frames_dir, f"{video_number}_{i}.jpg")
-            count, confidence = count_performers(image_path, model)
+            count, confidence = detections[(video_number, i)]
             
             sample_counts.append(count)
             sample_confidences.append(confidence)
@@ -1,6 +1,24 @@
 import os
-import subprocess
-import sys
+import torch
+from ultralytics import YOLO
+
+def training_device():
+    """
+    Return the device argument for training: every GPU when there are several,
+    so Ultralytics runs DDP across them, otherwise GPU 0 or the CPU
+    """
+    gpu_count = torch.cuda.device_count()
+    if gpu_count > 1:
+        return list(range(gpu_count))
+    return 0 if gpu_count == 1 else 'cpu'
+
+# Mixed precision, images cached in RAM, and enough loader workers to keep the GPUs fed
+SPEED_ARGS = {
+    'amp': True,
+    'cache': 'ram',
+    'workers': min(8, os.cpu_count() or 1),
+    'device': training_device()
+}
 
 def run_yolo_training():
     """
@@ -22,6 +40,7 @@ def run_yolo_training():
     epochs = input("Enter number of epochs (default: 25): ").strip()
     epochs = epochs if epochs else "25"
     
+    # With several GPUs the batch is split between them
     batch_size = input("Enter batch size (default: 16): ").strip()
     batch_size = batch_size if batch_size else "16"
     
@@ -36,44 +55,37 @@ def run_yolo_training():
     aug_choice = input("Enter augmentation option (1-2, default: 2): ").strip()
     
     # Set augmentation parameter
-    if aug_choice == "1":
-        aug_param = "augment=False"
-    else:
-        aug_param = "augment=True"
+    augment = aug_choice != "1"
     
-    # Construct the command
-    command = f"yolo train model={model_path} data={dataset_yaml} epochs={epochs} imgsz=640 batch={batch_size} lr0={learning_rate} {aug_param}"
+    try:
+        # Training arguments, passed straight to the Ultralytics API
+        train_args = {
+            'data': dataset_yaml,
+            'epochs': int(epochs),
+            'imgsz': 640,
+            'batch': int(batch_size),
+            'lr0': float(learning_rate),
+            'augment': augment,
+            **SPEED_ARGS
+        }
+    except ValueError as e:
+        print(f"Error: Invalid training parameter: {str(e)}")
+        return
     
-    # Display the command
-    print("\nRunning command:")
-    print(command)
+    # Display the settings
+    print("\nTraining with:")
+    print(f"model={model_path} " + " ".join(f"{key}={value}" for key, value in train_args.items()))
     print("\nTraining started. This may take a while...\n")
     
     try:
-        # Run the command
-        process = subprocess.Popen(
-            command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True
-        )
-        
-        # Print output in real-time
-        for line in iter(process.stdout.readline, ""):
-            print(line, end="")
-            sys.stdout.flush()
-        
-        process.stdout.close()
-        return_code = process.wait()
+        # Train in this process; Ultralytics prints its own progress
+        model = YOLO(model_path)
+        model.train(**train_args)
         
-        if return_code == 0:
-            print("\nTraining completed successfully!")
-        else:
-            print(f"\nTraining failed with return code {return_code}")
+        print("\nTraining completed successfully!")
             
     except Exception as e:
-        print(f"\nError running training command: {str(e)}")
+        print(f"\nError during training: {str(e)}")
 
 if __name__ == "__main__":
     print("=== YOLOv11 Training Script ===")